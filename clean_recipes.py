@@ -1,8 +1,34 @@
 import os
-import json
+import orjson
+import zstandard
+from concurrent.futures import ThreadPoolExecutor
+from io_utils import is_recipe_file, open_recipe
 
 # --- Configuration ---
 RECIPES_DIR = "recipes"
+MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+def _load_one(recipe_path):
+    """
+    Loads a single recipe file, returning (path, recipe) or (path, None) if it can't be read.
+    """
+    try:
+        with open_recipe(recipe_path) as f:
+            return recipe_path, orjson.loads(f.read())
+    except (orjson.JSONDecodeError, zstandard.ZstdError, IOError) as e:
+        print(f"Warning: Could not read or parse {recipe_path}. Skipping. Error: {e}")
+        return recipe_path, None
+
+def _safe_unlink(path):
+    """
+    Deletes a single file, returning True on success or False if it couldn't be removed.
+    """
+    try:
+        os.unlink(path)
+        return True
+    except OSError as e:
+        print(f"Error deleting {path}: {e}")
+        return False
 
 def find_recipes_to_delete():
     """
@@ -12,20 +38,20 @@ def find_recipes_to_delete():
         print(f"Error: Recipes directory not found at '{RECIPES_DIR}'")
         return []
 
-    all_recipe_files = [os.path.join(RECIPES_DIR, f) for f in os.listdir(RECIPES_DIR) if f.endswith('.json')]
+    with os.scandir(RECIPES_DIR) as it:
+        all_recipe_files = [entry.path for entry in it if entry.is_file(follow_symlinks=False) and is_recipe_file(entry.name)]
     paths_to_delete = []
 
     print(f"Scanning {len(all_recipe_files)} files...")
 
-    for recipe_path in all_recipe_files:
-        try:
-            with open(recipe_path, 'r') as f:
-                recipe = json.load(f)
-                # Check if 'image_url' key is missing, or if it's present but the value is empty/None
-                if not recipe.get('image_url'):
-                    paths_to_delete.append(recipe_path)
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"Warning: Could not read or parse {recipe_path}. Skipping. Error: {e}")
+    # Files are independent, so read and parse them concurrently
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for recipe_path, recipe in executor.map(_load_one, all_recipe_files):
+            if recipe is None:
+                continue
+            # Check if 'image_url' key is missing, or if it's present but the value is empty/None
+            if not recipe.get('image_url'):
+                paths_to_delete.append(recipe_path)
 
     return paths_to_delete
 
@@ -57,13 +83,9 @@ def main():
 
     if confirm == 'y':
         print("\nDeleting files...")
-        deleted_count = 0
-        for path in files_to_delete:
-            try:
-                os.remove(path)
-                deleted_count += 1
-            except OSError as e:
-                print(f"Error deleting {path}: {e}")
+        # Unlinks are independent, so overlap them across a thread pool
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            deleted_count = sum(executor.map(_safe_unlink, files_to_delete))
         print(f"\nSuccessfully deleted {deleted_count} files.")
     else:
         print("\nDeletion cancelled. No files were changed.")
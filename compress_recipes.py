@@ -0,0 +1,47 @@
+import os
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from io_utils import COMPRESSED_SUFFIX, dump_recipe_bytes
+
+# --- Configuration ---
+RECIPES_DIR = "recipes"
+MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+def compress_one(recipe_path):
+    """
+    Rewrites a plain .json recipe as .json.zst and removes the original.
+    Returns True if the file was converted.
+    """
+    compressed_path = recipe_path + COMPRESSED_SUFFIX
+    try:
+        with open(recipe_path, 'rb') as f:
+            recipe = orjson.loads(f.read())
+        # Write to a temporary name first so an interrupted run never leaves a truncated .zst behind
+        tmp_path = compressed_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(dump_recipe_bytes(compressed_path, recipe))
+        os.replace(tmp_path, compressed_path)
+        os.remove(recipe_path)
+        return True
+    except (orjson.JSONDecodeError, IOError) as e:
+        print(f"Warning: Could not convert {recipe_path}. Skipping. Error: {e}")
+        return False
+
+def main():
+    """
+    One-shot migration that zstd-compresses every plain .json recipe in the recipes directory.
+    """
+    if not os.path.isdir(RECIPES_DIR):
+        print(f"Error: Recipes directory not found at '{RECIPES_DIR}'")
+        return
+
+    with os.scandir(RECIPES_DIR) as it:
+        plain_recipe_files = [entry.path for entry in it if entry.is_file(follow_symlinks=False) and entry.name.endswith('.json')]
+
+    print(f"Compressing {len(plain_recipe_files)} recipe files...")
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        converted_count = sum(executor.map(compress_one, plain_recipe_files))
+    print(f"\nSuccessfully compressed {converted_count} files.")
+
+if __name__ == "__main__":
+    main()
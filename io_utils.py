@@ -0,0 +1,34 @@
+import orjson
+import zstandard
+
+# --- Configuration ---
+COMPRESSED_SUFFIX = ".zst"
+RECIPE_SUFFIXES = (".json", ".json.zst")
+ZSTD_LEVEL = 10
+
+def is_recipe_file(filename: str) -> bool:
+    """Returns True for plain (.json) and compressed (.json.zst) recipe files."""
+    return filename.endswith(RECIPE_SUFFIXES)
+
+def recipe_stem(filename: str) -> str:
+    """Strips the recipe suffix from a filename, so 'x.json' and 'x.json.zst' both give 'x'."""
+    for suffix in RECIPE_SUFFIXES:
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+def open_recipe(path: str):
+    """
+    Opens a recipe file for binary reading, transparently decompressing files that end in .zst.
+    Plain .json files are opened as-is. Writers go through dump_recipe_bytes instead.
+    """
+    if path.endswith(COMPRESSED_SUFFIX):
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+def dump_recipe_bytes(path: str, recipe: dict) -> bytes:
+    """Serializes a recipe into the on-disk bytes for the given path (zstd-compressed for .zst)."""
+    data = orjson.dumps(recipe, option=orjson.OPT_INDENT_2)
+    if path.endswith(COMPRESSED_SUFFIX):
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return data
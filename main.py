@@ -1,6 +1,7 @@
 import requests
-from bs4 import BeautifulSoup
-import json
+from lxml import etree
+import orjson
+import io
 
 SITEMAP_URL = "https://www.seriouseats.com/sitemap_1.xml"
 OUTPUT_JSON = "sitemap_data.json"
@@ -18,27 +19,27 @@ def fetch_and_save_sitemap_as_json(sitemap_url, output_file):
         return
 
     print("Parsing XML content...")
-    soup = BeautifulSoup(resp.content, "xml")
     entries = []
-    for url_tag in soup.find_all("url"):
-        loc_tag = url_tag.find("loc")
-        lastmod_tag = url_tag.find("lastmod")
-        changefreq_tag = url_tag.find("changefreq")
-        priority_tag = url_tag.find("priority")
-
+    # Stream <url> elements one at a time instead of building the whole tree
+    for _, url_elem in etree.iterparse(io.BytesIO(resp.content), events=("end",), tag="{*}url"):
         entry = {
-            "loc": loc_tag.text if loc_tag else None,
-            "lastmod": lastmod_tag.text if lastmod_tag else None,
-            "changefreq": changefreq_tag.text if changefreq_tag else None,
-            "priority": priority_tag.text if priority_tag else None,
+            "loc": url_elem.findtext("{*}loc"),
+            "lastmod": url_elem.findtext("{*}lastmod"),
+            "changefreq": url_elem.findtext("{*}changefreq"),
+            "priority": url_elem.findtext("{*}priority"),
         }
         entries.append(entry)
 
+        # Free the parsed element and any siblings already handled
+        url_elem.clear()
+        while url_elem.getprevious() is not None:
+            del url_elem.getparent()[0]
+
     print(f"Found {len(entries)} entries in the sitemap.")
 
     print(f"Saving data to {output_file}...")
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(entries, f, indent=2)
+    with open(output_file, "wb") as f:
+        f.write(orjson.dumps(entries, option=orjson.OPT_INDENT_2))
     print("Successfully saved data.")
 
 if __name__ == "__main__":
@@ -1,14 +1,19 @@
 import os
-import json
+import orjson
 import asyncio
+import aiofiles
+import functools
 import uuid
 from dotenv import load_dotenv
-from supabase import create_client, Client
 import fal_client
 import httpx
 from PIL import Image
 import io
+import mmap
 import re
+import zstandard
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from io_utils import COMPRESSED_SUFFIX, is_recipe_file, open_recipe, dump_recipe_bytes
 
 # --- Configuration ---
 load_dotenv() # Load variables from .env file
@@ -27,31 +32,65 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET_NAME", "images")
 
+# Supabase Storage endpoints and upload headers, built once rather than per recipe
+STORAGE_UPLOAD_URL = f"{SUPABASE_URL}/storage/v1/object/{SUPABASE_BUCKET}"
+STORAGE_PUBLIC_URL = f"{SUPABASE_URL}/storage/v1/object/public/{SUPABASE_BUCKET}"
+STORAGE_UPLOAD_HEADERS = {
+    "authorization": f"Bearer {SUPABASE_KEY}",
+    "apikey": SUPABASE_KEY,
+    "content-type": "image/webp",
+    "x-upsert": "true",
+}
+
+# WebP encoding quality
+WEBP_QUALITY = 85
+
 # Local file paths
 RECIPES_METADATA_FILE = "scraped_recipes.json"
 RECIPES_DIR = "recipes"
+PROCESSED_INDEX_FILE = ".processed_index.json"  # Maps recipe path -> mtime_ns of files known to be processed
+MAX_LOAD_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# A populated URL as written by json.dump/orjson with indentation; other spellings fall back to a full parse
+GENERATED_IMAGE_MARKER = b'"generated_image_url": "'
 
-# --- Initialization ---
-try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-except Exception as e:
-    print(f"Error initializing Supabase client: {e}")
-    print("Please ensure SUPABASE_URL and SUPABASE_KEY are set correctly in your .env file.")
-    exit()
+class _SlugTable(dict):
+    """
+    str.translate table for slugify: keeps a-z, 0-9 and '-', maps whitespace and '|' to '-',
+    and deletes everything else. Entries for characters outside ASCII are filled in on first use.
+    """
+    def __missing__(self, codepoint):
+        self[codepoint] = '-' if chr(codepoint).isspace() else None
+        return self[codepoint]
+
+_SLUG_TABLE = _SlugTable({ord(c): c for c in 'abcdefghijklmnopqrstuvwxyz0123456789-'})
+_SLUG_TABLE[ord('|')] = '-'
+_RE_DASHES = re.compile(r'--+')
+
+@functools.lru_cache(maxsize=65536)
+def _slug_from_text(text: str) -> str:
+    """Deterministic part of slugify, memoized since the same titles are re-slugged on every run."""
+    text = text.lower().translate(_SLUG_TABLE) # Keep a-z, 0-9 and hyphens; whitespace becomes a hyphen
+    text = _RE_DASHES.sub('-', text) # Replace multiple hyphens with a single one
+    return text.strip('-')
 
 def slugify(text: str) -> str:
     """Converts a string into a URL-friendly slug."""
-    text = text.replace('|', ' ')
-    text = text.lower()
-    text = re.sub(r'[^a-z0-9\s-]', '', text) # Remove punctuation except spaces and hyphens
-    text = re.sub(r'[\s_]+', '-', text) # Replace spaces and underscores with hyphens
-    text = re.sub(r'--+', '-', text) # Replace multiple hyphens with a single one
-    text = text.strip('-')
+    text = _slug_from_text(text)
     if not text:
-        return str(uuid.uuid4()) # Return a unique ID if slug is empty
+        return str(uuid.uuid4()) # Return a unique ID if slug is empty (kept out of the cache so IDs stay unique)
     return text
 
-async def process_recipe(recipe: dict, recipe_path: str, httpx_client: httpx.AsyncClient, semaphore: asyncio.Semaphore):
+def convert_to_webp(image_bytes: bytes) -> bytes:
+    """
+    Decodes an image and re-encodes it as WebP bytes.
+    Kept at module level so it can be pickled and run in the encode process pool.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        with io.BytesIO() as output_buffer:
+            img.save(output_buffer, format="WEBP", quality=WEBP_QUALITY)
+            return output_buffer.getvalue()
+
+async def process_recipe(recipe: dict, recipe_path: str, httpx_client: httpx.AsyncClient, semaphore: asyncio.Semaphore, encode_pool: ProcessPoolExecutor):
     """Handles the full processing pipeline for a single recipe asynchronously."""
     recipe_title = recipe.get('title', 'Untitled')
     source_image_url = recipe.get('image_url')
@@ -67,10 +106,10 @@ async def process_recipe(recipe: dict, recipe_path: str, httpx_client: httpx.Asy
             try:
                 # 1. Submit job to Fal.ai
                 print(f"  - Submitting to Fal.ai for '{recipe_title}'")
-                handler = await asyncio.to_thread(
-                    fal_client.submit, FAL_MODEL_ID, arguments={"image_url": source_image_url, **FAL_PARAMS}
+                handler = await fal_client.submit_async(
+                    FAL_MODEL_ID, arguments={"image_url": source_image_url, **FAL_PARAMS}
                 )
-                result = await asyncio.to_thread(handler.get)
+                result = await handler.get()
 
                 if not result or 'images' not in result or not result['images']:
                     raise ValueError("Fal.ai returned no images.")
@@ -83,39 +122,30 @@ async def process_recipe(recipe: dict, recipe_path: str, httpx_client: httpx.Asy
                 response.raise_for_status()
                 image_bytes = response.content
 
-                # 3. Convert to WebP in memory (using a thread for the CPU-bound task)
+                # 3. Convert to WebP in memory (in a worker process, so encodes run on all cores)
                 print(f"  - Converting to WebP for '{recipe_title}'")
-                def convert_to_webp(img_bytes):
-                    with Image.open(io.BytesIO(img_bytes)) as img:
-                        with io.BytesIO() as output_buffer:
-                            img.save(output_buffer, format="WEBP", quality=85)
-                            return output_buffer.getvalue()
-                webp_bytes = await asyncio.to_thread(convert_to_webp, image_bytes)
-
-                # 4. Upload to Supabase (using a thread for the blocking SDK call)
+                webp_bytes = await asyncio.get_running_loop().run_in_executor(
+                    encode_pool, convert_to_webp, image_bytes
+                )
+
+                # 4. Upload to Supabase Storage over the shared HTTP client
                 upload_path = f"{recipe_slug}.webp"
                 print(f"  - Uploading to Supabase at '{upload_path}'")
-                await asyncio.to_thread(
-                    supabase.storage.from_(SUPABASE_BUCKET).upload,
-                    path=upload_path,
-                    file=webp_bytes,
-                    file_options={"content-type": "image/webp", "upsert": "true"}
-                )
-                public_url_data = await asyncio.to_thread(
-                    supabase.storage.from_(SUPABASE_BUCKET).get_public_url, upload_path
+                upload_response = await httpx_client.post(
+                    f"{STORAGE_UPLOAD_URL}/{upload_path}", content=webp_bytes, headers=STORAGE_UPLOAD_HEADERS
                 )
-                supabase_image_url = public_url_data
+                upload_response.raise_for_status()
+                # Public URLs are deterministic, so build it locally instead of asking the API
+                supabase_image_url = f"{STORAGE_PUBLIC_URL}/{upload_path}"
 
-                # 5. Update the local recipe JSON file (using a thread for blocking file I/O)
+                # 5. Update the local recipe JSON file from the copy already in memory
                 print(f"  - Updating local file: {recipe_path}")
-                def update_json_file():
-                    with open(recipe_path, 'r+') as f:
-                        data = json.load(f)
-                        data['generated_image_url'] = supabase_image_url
-                        f.seek(0)
-                        json.dump(data, f, indent=2)
-                        f.truncate()
-                await asyncio.to_thread(update_json_file)
+                recipe['generated_image_url'] = supabase_image_url
+                # Write to a temporary file and swap it in, so an interrupted run never leaves a truncated recipe
+                tmp_path = f"{recipe_path}.tmp"
+                async with aiofiles.open(tmp_path, 'wb') as f:
+                    await f.write(dump_recipe_bytes(recipe_path, recipe))
+                os.replace(tmp_path, recipe_path)
 
                 print(f"✅ Successfully processed: {recipe_title}")
                 return supabase_image_url # Success, exit the retry loop
@@ -130,6 +160,56 @@ async def process_recipe(recipe: dict, recipe_path: str, httpx_client: httpx.Asy
                     print(f"❌ Error processing '{recipe_title}' after {attempt + 1} attempts: {e}")
                     return None # Permanent failure
 
+def _is_processed_blob(blob) -> bool:
+    """
+    Checks the raw file bytes (or a mmap of them) for a non-empty string 'generated_image_url'
+    without parsing the JSON. Only positive matches are trusted, since the result is cached in the
+    processed index; anything else (null, false, compact formatting) is parsed and checked properly.
+    """
+    return (
+        blob.find(GENERATED_IMAGE_MARKER) != -1
+        and blob.find(b'"generated_image_url": ""') == -1
+    )
+
+def _load_one(recipe_path: str):
+    """
+    Loads a single recipe file, returning (path, recipe, already_processed).
+    Plain files are memory-mapped, so already processed files are detected without copying
+    them into a buffer and are not parsed (recipe is None). Compressed files are decompressed first.
+    Unreadable files return (path, None, False).
+    """
+    try:
+        if recipe_path.endswith(COMPRESSED_SUFFIX):
+            with open_recipe(recipe_path) as f:
+                blob = f.read()
+            if _is_processed_blob(blob):
+                return recipe_path, None, True
+            return recipe_path, orjson.loads(blob), False
+
+        with open(recipe_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if _is_processed_blob(mm):
+                return recipe_path, None, True
+            with memoryview(mm) as view:
+                return recipe_path, orjson.loads(view), False
+    except (ValueError, zstandard.ZstdError, IOError) as e: # ValueError covers JSON errors and empty files, which can't be mapped
+        print(f"Warning: Could not read or parse {recipe_path}. Skipping. Error: {e}")
+        return recipe_path, None, False
+
+def load_processed_index() -> dict:
+    """Loads the processed-recipe index from disk, or returns an empty index if it is missing or unreadable."""
+    try:
+        with open(PROCESSED_INDEX_FILE, 'rb') as f:
+            return orjson.loads(f.read())
+    except (orjson.JSONDecodeError, IOError):
+        return {}
+
+def save_processed_index(index: dict):
+    """Atomically writes the processed-recipe index to disk."""
+    tmp_path = f"{PROCESSED_INDEX_FILE}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(orjson.dumps(index))
+    os.replace(tmp_path, PROCESSED_INDEX_FILE)
+
 async def main():
     """Main function to orchestrate the batch processing."""
     if not os.path.isdir(RECIPES_DIR):
@@ -137,39 +217,58 @@ async def main():
         print("Please run the recipe_scraper.py script first.")
         return
 
-    all_recipe_files = [os.path.join(RECIPES_DIR, f) for f in os.listdir(RECIPES_DIR) if f.endswith('.json')]
+    with os.scandir(RECIPES_DIR) as it:
+        recipe_mtimes = {
+            entry.path: entry.stat(follow_symlinks=False).st_mtime_ns
+            for entry in it if entry.is_file(follow_symlinks=False) and is_recipe_file(entry.name)
+        }
+    all_recipe_files = list(recipe_mtimes)
+
+    # Files recorded as processed in a previous run and unchanged since don't need to be read again
+    cached_index = load_processed_index()
+    processed_index = {}
+    files_to_load = []
+    for recipe_path, mtime in recipe_mtimes.items():
+        if cached_index.get(recipe_path) == mtime:
+            processed_index[recipe_path] = mtime
+        else:
+            files_to_load.append(recipe_path)
 
     # Load and filter recipes
     recipes_to_process = []
     recipes_missing_image = []
-    already_processed_count = 0
-
-    for recipe_path in all_recipe_files:
-        try:
-            with open(recipe_path, 'r') as f:
-                recipe = json.load(f)
-                if 'generated_image_url' in recipe and recipe['generated_image_url']:
-                    already_processed_count += 1
-                    continue
-
-                # Generate slug from title if it doesn't exist
-                if 'slug' not in recipe or not recipe.get('slug'):
-                    title = recipe.get('title')
-                    if title:
-                        recipe['slug'] = slugify(title)
-
-                if recipe.get('image_url') and recipe.get('slug'):
-                    recipes_to_process.append((recipe, recipe_path))
-                else:
-                    recipes_missing_image.append(recipe.get('title', 'Untitled Recipe'))
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"Warning: Could not read or parse {recipe_path}. Skipping. Error: {e}")
+    already_processed_count = len(processed_index)
+
+    # Files are independent, so read and parse them concurrently
+    with ThreadPoolExecutor(max_workers=MAX_LOAD_WORKERS) as executor:
+        loaded_recipes = list(executor.map(_load_one, files_to_load))
+
+    for recipe_path, recipe, already_processed in loaded_recipes:
+        if recipe is None and not already_processed:
+            continue
+        if already_processed or ('generated_image_url' in recipe and recipe['generated_image_url']):
+            processed_index[recipe_path] = recipe_mtimes[recipe_path]
+            already_processed_count += 1
+            continue
+
+        # Generate slug from title if it doesn't exist
+        if 'slug' not in recipe or not recipe.get('slug'):
+            title = recipe.get('title')
+            if title:
+                recipe['slug'] = slugify(title)
+
+        if recipe.get('image_url') and recipe.get('slug'):
+            recipes_to_process.append((recipe, recipe_path))
+        else:
+            recipes_missing_image.append(recipe.get('title', 'Untitled Recipe'))
 
     print(f"Found {len(all_recipe_files)} total recipe files.")
     print(f"- {already_processed_count} are already processed.")
     print(f"- {len(recipes_missing_image)} are missing a source image URL or slug.")
     print(f"- {len(recipes_to_process)} new recipes to process.")
 
+    save_processed_index(processed_index)
+
     if not recipes_to_process:
         print("\nNo new recipes to process. Exiting.")
         return
@@ -178,10 +277,21 @@ async def main():
     CONCURRENT_LIMIT = 10
     semaphore = asyncio.Semaphore(CONCURRENT_LIMIT)
 
-    # Create a single httpx client for all requests
-    async with httpx.AsyncClient(timeout=60.0) as httpx_client:
-        tasks = [process_recipe(recipe, path, httpx_client, semaphore) for recipe, path in recipes_to_process]
-        results = await asyncio.gather(*tasks)
+    # Create a single httpx client for all requests, and a process pool for the CPU-bound WebP encodes
+    encode_workers = min(CONCURRENT_LIMIT, os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=encode_workers) as encode_pool:
+        # HTTP/2 multiplexes the downloads and uploads over few connections; the pool is sized so
+        # every recipe allowed through the semaphore can hold a connection without waiting
+        limits = httpx.Limits(max_connections=2 * CONCURRENT_LIMIT, max_keepalive_connections=2 * CONCURRENT_LIMIT)
+        async with httpx.AsyncClient(http2=True, timeout=60.0, limits=limits) as httpx_client:
+            tasks = [process_recipe(recipe, path, httpx_client, semaphore, encode_pool) for recipe, path in recipes_to_process]
+            results = await asyncio.gather(*tasks)
+
+    # Record the freshly processed files so the next run can skip them
+    for (recipe, recipe_path), result in zip(recipes_to_process, results):
+        if result is not None:
+            processed_index[recipe_path] = os.stat(recipe_path).st_mtime_ns
+    save_processed_index(processed_index)
 
     print("\n--- Batch Processing Complete ---")
     successful_count = sum(1 for r in results if r is not None)
@@ -1,8 +1,72 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+import lxml.html
+from lxml import etree
+from lxml.cssselect import CSSSelector
 import json
 import time
 import os
+import re
+import codecs
+from concurrent.futures import ThreadPoolExecutor
+from io_utils import is_recipe_file, recipe_stem, dump_recipe_bytes
+
+# Number of recipes scraped concurrently over the shared session
+MAX_WORKERS = 16
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+# CSS selectors compiled to XPath once, instead of on every page
+RECIPE_BOX_SELECTOR = CSSSelector('div.recipe-decision-block', translator='html')
+PRIMARY_IMAGE_SELECTOR = CSSSelector('figure.primary-image img', translator='html')
+TAG_NAV_SELECTOR = CSSSelector('div.content-tax-cloud-tag-nav', translator='html')
+LINK_SELECTOR = CSSSelector('a', translator='html')
+PRINT_FORM_SELECTOR = CSSSelector('form[id^="recipe-decision-block__print-button"]', translator='html')
+CSRF_TOKEN_SELECTOR = CSSSelector('input[name="CSRFToken"]', translator='html')
+TITLE_SELECTOR = CSSSelector('h1.heading__title', translator='html')
+CONTENT_SELECTOR = CSSSelector('div.loc.content', translator='html')
+
+# Matches both <meta charset="..."> and <meta http-equiv="Content-Type" content="...; charset=...">
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+def detect_encoding(resp):
+    """
+    Picks the encoding for a response body: the charset from the Content-Type header if present,
+    then a charset declared in a <meta> tag, and UTF-8 only when the page declares nothing.
+    (requests reports Latin-1 for any text/* response without a header charset, so resp.encoding
+    can't be used on its own.)
+    """
+    content_type = resp.headers.get('Content-Type', '')
+    if 'charset' in content_type.lower() and resp.encoding:
+        return resp.encoding
+    match = META_CHARSET_RE.search(resp.content)
+    if match:
+        declared = match.group(1).decode('ascii')
+        try:
+            codecs.lookup(declared)
+            return declared
+        except LookupError:
+            pass
+    return 'utf-8'
+
+def parse_html(resp):
+    """
+    Parses a response body into an lxml tree, decoding it with detect_encoding(). Without an
+    explicit encoding lxml falls back to Latin-1 for pages lacking a <meta charset>, which
+    mangles any non-ASCII text.
+    """
+    parser = lxml.html.HTMLParser(encoding=detect_encoding(resp))
+    return lxml.html.fromstring(resp.content, parser=parser)
+
+def extract_text(node):
+    """
+    Returns the stripped, non-empty text fragments of an element joined by newlines.
+    Script and style contents are dropped, matching BeautifulSoup's get_text(separator='\n', strip=True).
+    """
+    etree.strip_elements(node, 'script', 'style', with_tail=False)
+    return '\n'.join(text.strip() for text in node.itertext() if text.strip())
 
 def scrape_recipe(session, url):
     """
@@ -12,15 +76,12 @@ def scrape_recipe(session, url):
     print(f"Scraping URL: {url}")
     try:
         # --- 1. GET Request to the main page ---
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        main_page_resp = session.get(url, headers=headers)
+        main_page_resp = session.get(url, headers=HEADERS)
         main_page_resp.raise_for_status()
-        main_soup = BeautifulSoup(main_page_resp.content, 'html.parser')
+        main_tree = parse_html(main_page_resp)
 
         # --- 2. Confirm it's a recipe ---
-        recipe_box = main_soup.find('div', class_='recipe-decision-block')
+        recipe_box = RECIPE_BOX_SELECTOR(main_tree)
         if not recipe_box:
             print("  -> Not a recipe page (missing recipe-decision-block). Skipping.")
             return None
@@ -28,37 +89,36 @@ def scrape_recipe(session, url):
         # --- 3. Extract from Main Page (Image, Tags, Form Data) ---
         # Image URL
         image_url = None
-        primary_image_figure = main_soup.find('figure', class_='primary-image')
-        if primary_image_figure:
-            img_tag = primary_image_figure.find('img')
-            if img_tag and img_tag.get('src'):
-                image_url = img_tag['src']
+        img_tags = PRIMARY_IMAGE_SELECTOR(main_tree)
+        if img_tags and img_tags[0].get('src'):
+            image_url = img_tags[0].get('src')
 
         # Tags
         tags = []
-        tag_container = main_soup.find('div', class_='content-tax-cloud-tag-nav')
-        if tag_container:
-            tag_links = tag_container.find_all('a')
-            tags = [link.text.strip() for link in tag_links]
+        tag_containers = TAG_NAV_SELECTOR(main_tree)
+        if tag_containers:
+            tag_links = LINK_SELECTOR(tag_containers[0])
+            tags = [link.text_content().strip() for link in tag_links]
 
         # Print Form Data
-        print_form = main_soup.find('form', id=lambda x: x and x.startswith('recipe-decision-block__print-button'))
-        if not print_form:
+        print_forms = PRINT_FORM_SELECTOR(main_tree)
+        if not print_forms:
             print("  -> Could not find print button form. Skipping.")
             return None
+        print_form = print_forms[0]
 
-        action_url_suffix = print_form['action']
+        action_url_suffix = print_form.attrib['action']
         action_url = f"https://www.seriouseats.com{action_url_suffix}"
-        csrf_token = print_form.find('input', {'name': 'CSRFToken'})
-        if not csrf_token:
+        csrf_tokens = CSRF_TOKEN_SELECTOR(print_form)
+        if not csrf_tokens:
             print("  -> Could not find CSRF token. Skipping.")
             return None
-        csrf_value = csrf_token['value']
+        csrf_value = csrf_tokens[0].attrib['value']
 
         # --- 4. POST Request to get printable page ---
-        print_page_resp = session.post(action_url, data={'CSRFToken': csrf_value}, headers=headers)
+        print_page_resp = session.post(action_url, data={'CSRFToken': csrf_value}, headers=HEADERS)
         print_page_resp.raise_for_status()
-        print_soup = BeautifulSoup(print_page_resp.content, 'html.parser')
+        print_tree = parse_html(print_page_resp)
 
         # --- 5. Simplified Extraction from Print Page ---
         recipe_data = {
@@ -70,14 +130,14 @@ def scrape_recipe(session, url):
         }
 
         # Title
-        title_tag = print_soup.find('h1', class_='heading__title')
-        recipe_data['title'] = title_tag.text.strip() if title_tag else "Untitled"
+        title_tags = TITLE_SELECTOR(print_tree)
+        recipe_data['title'] = title_tags[0].text_content().strip() if title_tags else "Untitled"
 
         # Full Text
-        content_container = print_soup.find('div', class_='loc content')
-        if content_container:
-            # Use get_text with a separator to preserve line breaks
-            recipe_data['full_text'] = content_container.get_text(separator='\n', strip=True)
+        content_containers = CONTENT_SELECTOR(print_tree)
+        if content_containers:
+            # Join text fragments with newlines to preserve line breaks
+            recipe_data['full_text'] = extract_text(content_containers[0])
         
         print(f"  -> Successfully scraped: {recipe_data['title']}")
         return recipe_data
@@ -89,6 +149,18 @@ def scrape_recipe(session, url):
         print(f"  -> An unexpected error occurred for {url}: {e}")
         return None
 
+def scrape_and_save(session, url, filepath):
+    """
+    Scrapes a single recipe and saves it to its own file.
+    Returns True if a new recipe was written.
+    """
+    recipe = scrape_recipe(session, url)
+    if not recipe:
+        return False
+    with open(filepath, 'wb') as f:
+        f.write(dump_recipe_bytes(filepath, recipe))
+    return True
+
 def main():
     # Load URLs from the sitemap data
     try:
@@ -103,33 +175,40 @@ def main():
     os.makedirs(output_dir, exist_ok=True)
     print(f"Saving recipes to '{output_dir}/' directory.")
 
-    # Process all URLs from the sitemap
-    urls_to_scrape = sitemap_urls
-    print(f"--- Starting full scrape for {len(urls_to_scrape)} URLs ---")
+    # Collect already scraped slugs with a single directory scan instead of a stat per URL.
+    # Both plain and compressed recipe files count, so existing .json files aren't scraped again.
+    with os.scandir(output_dir) as it:
+        scraped_slugs = {recipe_stem(entry.name) for entry in it if is_recipe_file(entry.name)}
+
+    # Work out which URLs still need scraping before dispatching any work,
+    # so the script stays resumable and no two workers write the same file
+    urls_to_scrape = []
+    for url in sitemap_urls:
+        # Generate a clean filename from the URL slug
+        slug = url.strip('/').split('/')[-1]
+        if not slug:
+            slug = f"recipe_{hash(url)}"
+        filename = f"{slug}.json.zst"
+        filepath = os.path.join(output_dir, filename)
+
+        # Silently skip already scraped (or already queued) files in the full run
+        if slug in scraped_slugs:
+            continue
+        scraped_slugs.add(slug)
+        urls_to_scrape.append((url, filepath))
+
+    print(f"--- Starting full scrape for {len(urls_to_scrape)} URLs ({len(sitemap_urls) - len(urls_to_scrape)} already scraped) ---")
 
-    new_recipes_found = 0
     with requests.Session() as session:
-        for url in urls_to_scrape:
-            # Generate a clean filename from the URL slug
-            slug = url.strip('/').split('/')[-1]
-            if not slug:
-                slug = f"recipe_{hash(url)}"
-            filename = f"{slug}.json"
-            filepath = os.path.join(output_dir, filename)
-
-            # Check if file already exists to make the script resumable
-            if os.path.exists(filepath):
-                # Silently skip already scraped files in the full run
-                continue
-
-            recipe = scrape_recipe(session, url)
-            if recipe:
-                # Save the recipe to its own file
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(recipe, f, indent=2)
-                new_recipes_found += 1
-            
-            # No delay as per user request
+        # Size the connection pool to match the workers so connections are reused, not discarded
+        adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        # No delay as per user request
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            results = executor.map(lambda job: scrape_and_save(session, *job), urls_to_scrape)
+            new_recipes_found = sum(results)
 
     print(f"\n--- Scraping complete. Found {new_recipes_found} new recipes. ---")
 